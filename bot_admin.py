@@ -0,0 +1,293 @@
+import asyncio
+import io
+import json
+import logging
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from memory import memory_stats
+from sharding import UPDATES_KEY
+
+logger = logging.getLogger(__name__)
+
+class AdminCommandsMixin:
+    """Админ-команды, профилирование и шардирование, общие для обоих ботов.
+
+    Ожидает у класса бота атрибуты monitor, shard, user_id, application,
+    is_running, check_interval_minutes, stats, memory_budget_mb, _wakeup,
+    _sleep и метод _run_monitoring_loop.
+    """
+    
+    def _add_admin_handlers(self):
+        """Регистрирует админ-команды"""
+        self.application.add_handler(CommandHandler("profile", self.profile_command))
+        self.application.add_handler(CommandHandler("add_name", self.add_name_command))
+        self.application.add_handler(CommandHandler("remove_name", self.remove_name_command))
+        self.application.add_handler(CommandHandler("interval", self.interval_command))
+        self.application.add_handler(CommandHandler("targets", self.targets_command))
+        self.application.add_handler(CommandHandler("stats", self.stats_command))
+    
+    async def profile_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /profile [N] - профилирование следующих N циклов (только админ)"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        profiler = self.monitor.profiler
+        if context.args and context.args[0] != "result":
+            try:
+                cycles = int(context.args[0])
+            except ValueError:
+                await update.message.reply_text("Использование: /profile [N|result]")
+                return
+            reason = await asyncio.to_thread(self.profiling_unavailable_reason)
+            if reason:
+                await update.message.reply_text(f"❌ {reason}")
+                return
+            profiler.request(cycles)
+            await update.message.reply_text(f"⏱️ Профилирую следующие {profiler.pending} циклов. Результат: /profile result")
+            return
+        
+        if profiler.pending:
+            reason = await asyncio.to_thread(self.profiling_unavailable_reason)
+            suffix = f"\n⚠️ {reason}" if reason else ""
+            await update.message.reply_text(f"⏳ Осталось циклов: {profiler.pending}{suffix}")
+            return
+        
+        await update.message.reply_text(f"⏱️ Разбивка по этапам:\n\n{profiler.format_report()}")
+        if profiler.last_folded:
+            await update.message.reply_document(
+                document=io.BytesIO(profiler.last_folded.encode()),
+                filename="profile.folded"
+            )
+    
+    def _run_sharded_monitoring_loop(self):
+        """Цикл мониторинга реплики; если поток завершился, реплика выходит из кольца"""
+        try:
+            self._run_monitoring_loop()
+        finally:
+            logger.error("Цикл мониторинга реплики %s завершился, выходим из кольца", self.shard.replica_id)
+            self.shard.stop()
+    
+    def profiling_unavailable_reason(self) -> Optional[str]:
+        """Почему циклы на этой реплике сейчас не идут (профиль не будет собран), или None"""
+        if self.shard is None:
+            return None if self.is_running else "Мониторинг остановлен, запустите /start_monitoring"
+        if self.shard.get_flag("monitoring") != "1":
+            return "Мониторинг остановлен, запустите /start_monitoring"
+        owner = self.shard.owner(self.monitor.target_url)
+        if owner != self.shard.replica_id:
+            return f"Цель обслуживает реплика {owner}, профиль можно снять только на ней"
+        return None
+    
+    async def _monitoring_active(self) -> bool:
+        """Идет ли мониторинг; при шардировании is_running всегда True, состояние - в общем флаге"""
+        if self.shard is None:
+            return self.is_running
+        return await asyncio.to_thread(self.shard.get_flag, "monitoring") == "1"
+    
+    def _is_admin(self, update: Update) -> bool:
+        """Админ - пользователь из TELEGRAM_USER_ID"""
+        return str(update.effective_user.id) == str(self.user_id)
+    
+    async def add_name_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /add_name <имя> - добавить имя в поиск без перезапуска"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        name = " ".join(context.args)
+        if not name:
+            await update.message.reply_text("Использование: /add_name Иван Иванов")
+            return
+        if not await asyncio.to_thread(self._change_search_names, self.monitor.add_search_name, name):
+            await update.message.reply_text(f"ℹ️ «{name}» уже в списке")
+            return
+        await update.message.reply_text(f"✅ Добавлено. Ищем: {', '.join(self.monitor.search_names)}")
+    
+    async def remove_name_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /remove_name <имя> - убрать имя из поиска"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        name = " ".join(context.args)
+        if not name:
+            await update.message.reply_text("Использование: /remove_name Иван Иванов")
+            return
+        if not await asyncio.to_thread(self._change_search_names, self.monitor.remove_search_name, name):
+            await update.message.reply_text(f"❌ «{name}» нет в списке")
+            return
+        await update.message.reply_text(f"✅ Удалено. Ищем: {', '.join(self.monitor.search_names) or '-'}")
+    
+    async def interval_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /interval <минуты> - изменить интервал проверки"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        if not context.args:
+            await asyncio.to_thread(self._sync_shared_settings)
+            await update.message.reply_text(f"⏰ Интервал: {self.check_interval_minutes} мин")
+            return
+        try:
+            minutes = int(context.args[0])
+        except ValueError:
+            minutes = 0
+        if minutes < 1:
+            await update.message.reply_text("Использование: /interval 10 (минуты, не меньше 1)")
+            return
+        
+        await asyncio.to_thread(self._set_interval, minutes)
+        await update.message.reply_text(f"✅ Интервал: {minutes} мин")
+    
+    async def targets_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /targets - показать цели мониторинга"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        await asyncio.to_thread(self._sync_shared_settings)
+        monitor = self.monitor
+        lines = [f"🌐 {monitor.target_url}"]
+        if monitor.max_pages > 1:
+            pages = monitor.page_template or "ссылки пагинации"
+            lines.append(f"📄 До {monitor.max_pages} страниц ({pages}), параллельно {monitor.page_concurrency}")
+        if self.shard is not None:
+            lines.append(f"🧩 Реплика-владелец: {self.shard.owner(monitor.target_url)} (эта: {self.shard.replica_id})")
+        lines.append(f"🔍 Ищем: {', '.join(monitor.search_names) or '-'}")
+        lines.append(f"⏰ Интервал: {self.check_interval_minutes} мин")
+        await update.message.reply_text("\n".join(lines))
+    
+    async def stats_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /stats - статистика циклов мониторинга"""
+        if not self._is_admin(update):
+            await update.message.reply_text("⛔ Команда доступна только администратору")
+            return
+        
+        stats = self.stats
+        memory = memory_stats()
+        memory_line = f"{memory['rss_mb']} МБ (пик {memory['peak_rss_mb']} МБ)"
+        if "traced_mb" in memory:
+            memory_line += f", tracemalloc {memory['traced_mb']} МБ"
+        if self.memory_budget_mb:
+            memory_line += f", бюджет {self.memory_budget_mb} МБ"
+        uptime_minutes = int((time.time() - stats["started_at"]) / 60)
+        last_cycle = (
+            f"{stats['last_cycle_seconds']:.2f} с, найдено {stats['last_found']}"
+            if stats["last_cycle_seconds"] is not None else "-"
+        )
+        await update.message.reply_text(
+            f"📈 Статистика:\n\n"
+            f"⏱️ Аптайм: {uptime_minutes} мин\n"
+            f"🔄 Циклов: {stats['cycles']}\n"
+            f"🕐 Последний цикл: {last_cycle}\n"
+            f"📨 Уведомлений: {stats['notifications']}\n"
+            f"❗ Ошибок: {stats['errors']}\n"
+            f"💾 Память: {memory_line}"
+        )
+    
+    def _set_interval(self, minutes: int):
+        """Меняет интервал и будит цикл, чтобы он пересчитал время следующей проверки"""
+        if self.shard is not None:
+            self.shard.set_flag("interval_minutes", str(minutes))
+        self.check_interval_minutes = minutes
+        self._wakeup.set()
+    
+    def _interruptible_sleep(self, seconds: float) -> bool:
+        """Пауза цикла; True, если ее прервало изменение настроек"""
+        woken = self._wakeup.wait(seconds)
+        self._wakeup.clear()
+        return woken
+    
+    def _wait_next_cycle(self, cycle_started: float):
+        """Ждет следующего цикла, учитывая смену интервала во время ожидания"""
+        while self.is_running:
+            remaining = cycle_started + self.check_interval_minutes * 60 - time.monotonic()
+            if remaining <= 0:
+                return
+            if self.shard is None:
+                if not self._sleep(remaining):
+                    return
+                continue
+            # /interval на другой реплике будит только ее цикл, поэтому ждем
+            # отрезками heartbeat и перечитываем общий интервал
+            self._sleep(min(remaining, self.shard.heartbeat_seconds))
+            self._sync_shared_settings()
+    
+    def _change_search_names(self, change: Callable[[str], bool], name: str) -> bool:
+        """Добавляет или убирает имя; при шардировании - в общем списке.
+
+        Общий список читается, меняется и записывается в одной транзакции,
+        поэтому реплика с устаревшим локальным списком не затрет чужие изменения.
+        """
+        if self.shard is None:
+            return change(name)
+        changed = False
+
+        def update(current: str) -> str:
+            nonlocal changed
+            if current:
+                self.monitor.set_search_names(json.loads(current))
+            changed = change(name)
+            return json.dumps(self.monitor.search_names, ensure_ascii=False)
+
+        self.shard.update_flag("search_names", update)
+        return changed
+    
+    def _sync_shared_settings(self):
+        """Подхватывает настройки, измененные командами на другой реплике"""
+        if self.shard is None:
+            return
+        names = self.shard.get_flag("search_names")
+        if names and json.loads(names) != self.monitor.search_names:
+            self.monitor.set_search_names(json.loads(names))
+        interval = self.shard.get_flag("interval_minutes")
+        if interval and int(interval) != self.check_interval_minutes:
+            self.check_interval_minutes = int(interval)
+    
+    def _owns_target(self) -> bool:
+        """Должна ли эта реплика опрашивать цель в текущем цикле"""
+        if self.shard is None:
+            return True
+        if self.shard.get_flag("monitoring") != "1":
+            self.shard.release(self.monitor.target_url)
+            return False
+        # Аренда на цикл с запасом на таймауты загрузки страниц
+        return self.shard.acquire(self.monitor.target_url, self.shard.ttl + 120)
+    
+    async def _sync_updates_polling(self):
+        """Опрашивает Telegram только на реплике-владельце ключа обновлений"""
+        updater = self.application.updater
+        if self.shard is None:
+            if not updater.running:
+                await updater.start_polling()
+            return
+        
+        # SQLite может ждать блокировку до 10 с - не держим event loop с командами
+        try:
+            # Опрашивает владелец цели: у него профилировщик и счетчики циклов
+            should_poll = await asyncio.to_thread(
+                self.shard.acquire, UPDATES_KEY, ring_key=self.monitor.target_url, release_if_lost=False
+            )
+        except sqlite3.Error as e:
+            # Без подтвержденной аренды не опрашиваем, чтобы не было двух getUpdates
+            logger.error("Ошибка аренды опроса Telegram: %s", e)
+            should_poll = False
+        if should_poll:
+            if not updater.running:
+                await updater.start_polling()
+            return
+        
+        if updater.running:
+            await updater.stop()
+        # Аренду отпускаем только после остановки getUpdates, иначе новый владелец
+        # успеет начать опрос параллельно и получит 409 Conflict
+        try:
+            await asyncio.to_thread(self.shard.release, UPDATES_KEY)
+        except sqlite3.Error as e:
+            logger.error("Ошибка освобождения аренды опроса Telegram: %s", e)
@@ -12,5 +12,28 @@ TARGET_URL = os.getenv('TARGET_URL', '')
 SEARCH_NAMES = os.getenv('SEARCH_NAMES', '').split(',')  # Comma-separated names
 CHECK_INTERVAL_MINUTES = int(os.getenv('CHECK_INTERVAL_MINUTES', '10'))
 
+# Pagination (обход нескольких страниц таблицы)
+PAGE_URL_TEMPLATE = os.getenv('PAGE_URL_TEMPLATE', '')  # Например https://example.com/queue?page={page}; пусто - искать ссылки пагинации
+MAX_PAGES = int(os.getenv('MAX_PAGES', '1'))  # 1 - только TARGET_URL
+PAGE_CONCURRENCY = int(os.getenv('PAGE_CONCURRENCY', '4'))  # Сколько страниц загружать одновременно
+STOP_WHEN_FOUND = os.getenv('STOP_WHEN_FOUND', 'false').lower() == 'true'  # Прекращать обход, когда все имена найдены
+
+# Sharding (несколько реплик делят цели через общий SQLite-файл)
+SHARD_DB_PATH = os.getenv('SHARD_DB_PATH', '')  # Пусто - шардирование выключено
+SHARD_REPLICA_ID = os.getenv('SHARD_REPLICA_ID', '')  # По умолчанию hostname-pid
+SHARD_HEARTBEAT_SECONDS = float(os.getenv('SHARD_HEARTBEAT_SECONDS', '15'))
+
+# Record/replay
+RECORD_TRAFFIC_PATH = os.getenv('RECORD_TRAFFIC_PATH', '')  # Например traffic.jsonl.gz; пусто - запись выключена
+
+# Memory
+MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', '0'))  # Бюджет RSS; при превышении - сборка мусора и возврат памяти ОС; 0 - выключено
+MEMORY_TRACEMALLOC = os.getenv('MEMORY_TRACEMALLOC', 'false').lower() == 'true'  # Включить tracemalloc для /stats и /memory
+
+# Profiling
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')  # Токен для /profile веб-эндпоинта; пусто - эндпоинт отключен
+
 # Logging
-LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO') 
\ No newline at end of file
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # text или json
+LOG_SAMPLE_SECONDS = float(os.getenv('LOG_SAMPLE_SECONDS', '60'))  # Окно сэмплирования одинаковых сводок проверок
@@ -0,0 +1,151 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from typing import Optional
+
+from lru import LRUCache
+
+# Поля LogRecord, которые не нужно дублировать в JSON
+_RESERVED_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+# Сколько записей может ждать вывода; при потоке логов сверх этого записи отбрасываются
+LOG_QUEUE_SIZE = 10000
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует записи лога в одну строку JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        # Структурированные поля, переданные через extra=
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        # Трейсбек приходит уже отформатированным (см. _QueueHandler.prepare)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, сохраняющий трейсбек в exc_text, а не внутри текста сообщения.
+
+    Очередь ограничена: при переполнении запись отбрасывается, а число
+    потерянных добавляется к следующей записи, попавшей в очередь.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        # exc_info нельзя передавать в другой поток: в нем живые кадры стека
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        # Вызывается под блокировкой обработчика, счетчик не требует своей
+        dropped = self.dropped
+        if dropped:
+            record.dropped = dropped
+            record.msg = f"{record.msg} (+{dropped} записей потеряно: очередь лога переполнена)"
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        self.dropped = 0
+
+class _QueueListener(logging.handlers.QueueListener):
+    """QueueListener, дожидающийся места в ограниченной очереди для сигнала остановки"""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+class SamplingFilter(logging.Filter):
+    """Пропускает одинаковые сообщения не чаще одного раза за interval секунд.
+
+    Сэмплируются только записи, явно помеченные extra={"sample": True};
+    ключ - отформатированное сообщение, поэтому разные события одного
+    шаблона не подавляют друг друга.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        # Ограничиваем число отслеживаемых шаблонов, чтобы фильтр не рос бесконечно
+        self._last_seen = LRUCache(1024)
+        self._suppressed = LRUCache(1024)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Ошибки, предупреждения и непомеченные записи не сэмплируем
+        if self.interval <= 0 or record.levelno >= logging.WARNING or not getattr(record, 'sample', False):
+            return True
+
+        key = (record.name, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_seen.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last_seen[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+            # В текстовом формате extra-поля не выводятся - число пропущенных пишем в само сообщение
+            record.msg = f"{record.getMessage()} (+{suppressed} пропущено)"
+            record.args = None
+        return True
+
+def setup_logging(level: str = 'INFO', log_format: str = 'text', sample_interval: float = 0) -> None:
+    """Настраивает неблокирующее логирование через QueueHandler"""
+    global _listener
+
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    # Запись в поток выполняется в отдельном потоке слушателя,
+    # поэтому загрузка и парсинг страницы не ждут I/O логов
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_interval))
+
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, level.upper(), logging.INFO))
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = _QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Останавливает поток слушателя и сбрасывает оставшиеся записи"""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,16 +1,21 @@
 import asyncio
 import logging
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, TARGET_URL, SEARCH_NAMES, CHECK_INTERVAL_MINUTES, LOG_LEVEL
+import tracemalloc
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, TARGET_URL, SEARCH_NAMES, CHECK_INTERVAL_MINUTES, \
+    PAGE_URL_TEMPLATE, MAX_PAGES, PAGE_CONCURRENCY, STOP_WHEN_FOUND, LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_SECONDS, \
+    SHARD_DB_PATH, SHARD_REPLICA_ID, SHARD_HEARTBEAT_SECONDS, RECORD_TRAFFIC_PATH, \
+    MEMORY_BUDGET_MB, MEMORY_TRACEMALLOC, PROFILE_TOKEN
+from log_config import setup_logging, shutdown_logging
 from website_monitor import WebsiteMonitor
+from sharding import ShardCoordinator
+from replay import TrafficRecorder
+from memory import memory_stats
 from telegram_bot import MonitoringBot
 from aiohttp import web
 import os
 
 # Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_SECONDS)
 
 logger = logging.getLogger(__name__)
 
@@ -21,12 +26,47 @@ async def healthcheck_handler(request):
     """Обработчик для healthcheck"""
     return web.Response(text="OK", status=200, content_type='text/plain')
 
+async def profile_handler(request):
+    """Обработчик профилирования: ?cycles=N запускает, без параметров возвращает результат"""
+    token = request.headers.get('X-Profile-Token') or request.query.get('token')
+    if not PROFILE_TOKEN or token != PROFILE_TOKEN:
+        return web.Response(text="Forbidden", status=403, content_type='text/plain')
+    if bot_instance is None:
+        return web.Response(text="Bot is not running", status=503, content_type='text/plain')
+    
+    profiler = bot_instance.monitor.profiler
+    if 'cycles' in request.query:
+        try:
+            cycles = int(request.query['cycles'])
+        except ValueError:
+            return web.Response(text="cycles must be an integer", status=400, content_type='text/plain')
+        reason = await asyncio.to_thread(bot_instance.profiling_unavailable_reason)
+        if reason:
+            return web.json_response({"status": "unavailable", "reason": reason}, status=409)
+        profiler.request(cycles, sampling=request.query.get('sampling', '1') != '0')
+        return web.json_response({"status": "armed", "cycles": profiler.pending}, status=202)
+    
+    if profiler.pending:
+        return web.json_response({"status": "pending", "cycles_left": profiler.pending}, status=202)
+    if request.query.get('format') == 'folded':
+        return web.Response(text=profiler.last_folded, content_type='text/plain')
+    return web.json_response(profiler.last_report or {})
+
+async def memory_handler(request):
+    """Обработчик статистики памяти (RSS и tracemalloc)"""
+    token = request.headers.get('X-Profile-Token') or request.query.get('token')
+    if not PROFILE_TOKEN or token != PROFILE_TOKEN:
+        return web.Response(text="Forbidden", status=403, content_type='text/plain')
+    return web.json_response(memory_stats())
+
 async def start_web_server():
     """Запускает веб-сервер для healthcheck"""
     try:
         app = web.Application()
         app.router.add_get('/', healthcheck_handler)
         app.router.add_get('/health', healthcheck_handler)
+        app.router.add_get('/profile', profile_handler)
+        app.router.add_get('/memory', memory_handler)
         
         port = int(os.environ.get('PORT', 8080))
         logger.info(f"Запуск веб-сервера на порту {port}")
@@ -80,10 +120,34 @@ async def main():
     
     try:
         # Создаем монитор сайта
-        monitor = WebsiteMonitor(TARGET_URL, SEARCH_NAMES)
+        monitor = WebsiteMonitor(
+            TARGET_URL, SEARCH_NAMES, PAGE_URL_TEMPLATE, MAX_PAGES, PAGE_CONCURRENCY, STOP_WHEN_FOUND
+        )
+        
+        # Подключаемся к координатору реплик, если включено шардирование
+        shard = None
+        if SHARD_DB_PATH:
+            shard = ShardCoordinator(SHARD_DB_PATH, SHARD_REPLICA_ID or None, SHARD_HEARTBEAT_SECONDS)
+            shard.start()
+            logger.info("Шардирование включено, реплика %s", shard.replica_id)
         
         # Создаем и запускаем бота
-        bot_instance = MonitoringBot(TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, monitor)
+        bot_instance = MonitoringBot(TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, monitor, shard, CHECK_INTERVAL_MINUTES)
+        
+        bot_instance.memory_budget_mb = MEMORY_BUDGET_MB
+        if MEMORY_TRACEMALLOC:
+            tracemalloc.start()
+        
+        # Записываем трафик для последующего воспроизведения (replay.py)
+        recorder = None
+        if RECORD_TRAFFIC_PATH:
+            recorder = TrafficRecorder(RECORD_TRAFFIC_PATH)
+            recorder.record_config(monitor)
+            # По SIGTERM (остановка контейнера) дописываем буфер до выхода
+            recorder.install_signal_handler()
+            monitor.recorder = recorder
+            bot_instance.recorder = recorder
+            logger.info("Запись трафика в %s", RECORD_TRAFFIC_PATH)
         
         # Запускаем веб-сервер для healthcheck
         web_runner = await start_web_server()
@@ -102,6 +166,14 @@ async def main():
         # Останавливаем веб-сервер
         if 'web_runner' in locals() and web_runner:
             await web_runner.cleanup()
+        # Освобождаем ключи реплики, чтобы остальные сразу их подхватили
+        if 'shard' in locals() and shard:
+            shard.stop()
+        if 'recorder' in locals() and recorder:
+            recorder.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_logging() 
\ No newline at end of file
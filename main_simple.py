@@ -1,14 +1,18 @@
 import asyncio
 import logging
-from config import TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, TARGET_URL, SEARCH_NAMES, CHECK_INTERVAL_MINUTES, LOG_LEVEL
+import tracemalloc
+from config import TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, TARGET_URL, SEARCH_NAMES, CHECK_INTERVAL_MINUTES, \
+    PAGE_URL_TEMPLATE, MAX_PAGES, PAGE_CONCURRENCY, STOP_WHEN_FOUND, LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_SECONDS, \
+    SHARD_DB_PATH, SHARD_REPLICA_ID, SHARD_HEARTBEAT_SECONDS, RECORD_TRAFFIC_PATH, \
+    MEMORY_BUDGET_MB, MEMORY_TRACEMALLOC
+from log_config import setup_logging, shutdown_logging
 from website_monitor import WebsiteMonitor
+from sharding import ShardCoordinator
+from replay import TrafficRecorder
 from telegram_bot_webhook import WebhookMonitoringBot
 
 # Настройка логирования
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_SAMPLE_SECONDS)
 
 logger = logging.getLogger(__name__)
 
@@ -47,10 +51,34 @@ async def main():
     
     try:
         # Создаем монитор сайта
-        monitor = WebsiteMonitor(TARGET_URL, SEARCH_NAMES)
+        monitor = WebsiteMonitor(
+            TARGET_URL, SEARCH_NAMES, PAGE_URL_TEMPLATE, MAX_PAGES, PAGE_CONCURRENCY, STOP_WHEN_FOUND
+        )
+        
+        # Подключаемся к координатору реплик, если включено шардирование
+        shard = None
+        if SHARD_DB_PATH:
+            shard = ShardCoordinator(SHARD_DB_PATH, SHARD_REPLICA_ID or None, SHARD_HEARTBEAT_SECONDS)
+            shard.start()
+            logger.info("Шардирование включено, реплика %s", shard.replica_id)
         
         # Создаем и запускаем бота
-        bot = WebhookMonitoringBot(TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, monitor)
+        bot = WebhookMonitoringBot(TELEGRAM_BOT_TOKEN, TELEGRAM_USER_ID, monitor, shard, CHECK_INTERVAL_MINUTES)
+        
+        bot.memory_budget_mb = MEMORY_BUDGET_MB
+        if MEMORY_TRACEMALLOC:
+            tracemalloc.start()
+        
+        # Записываем трафик для последующего воспроизведения (replay.py)
+        recorder = None
+        if RECORD_TRAFFIC_PATH:
+            recorder = TrafficRecorder(RECORD_TRAFFIC_PATH)
+            recorder.record_config(monitor)
+            # По SIGTERM (остановка контейнера) дописываем буфер до выхода
+            recorder.install_signal_handler()
+            monitor.recorder = recorder
+            bot.recorder = recorder
+            logger.info("Запись трафика в %s", RECORD_TRAFFIC_PATH)
         
         logger.info("✅ Бот запущен и готов к работе!")
         
@@ -63,6 +91,15 @@ async def main():
         logger.error(f"Ошибка при запуске бота: {e}")
         import traceback
         logger.error(f"Полная ошибка: {traceback.format_exc()}")
+    finally:
+        # Освобождаем ключи реплики, чтобы остальные сразу их подхватили
+        if 'shard' in locals() and shard:
+            shard.stop()
+        if 'recorder' in locals() and recorder:
+            recorder.close()
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    finally:
+        shutdown_logging() 
\ No newline at end of file
@@ -0,0 +1,98 @@
+import ctypes
+import ctypes.util
+import gc
+import logging
+import mmap
+import sys
+import tracemalloc
+from functools import lru_cache
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Пока RSS выше бюджета и очистка не помогает, повторяем ее все реже
+MAX_BACKOFF_CYCLES = 64
+_backoff = 1
+_skip_cycles = 0
+
+def rss_bytes() -> int:
+    """Текущий RSS процесса (на Linux - из /proc, иначе пиковый)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, IndexError, ValueError):
+        return peak_rss_bytes()
+
+def peak_rss_bytes() -> int:
+    """Пиковый RSS процесса (0, если платформа его не сообщает)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def memory_stats() -> dict:
+    """RSS и, если включен, tracemalloc в мегабайтах"""
+    stats = {
+        "rss_mb": round(rss_bytes() / 2 ** 20, 1),
+        "peak_rss_mb": round(peak_rss_bytes() / 2 ** 20, 1),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        stats["traced_mb"] = round(current / 2 ** 20, 2)
+        stats["traced_peak_mb"] = round(peak / 2 ** 20, 2)
+    return stats
+
+@lru_cache(maxsize=None)
+def _malloc_trim_func():
+    """Ищет malloc_trim один раз за процесс; None, если это не glibc"""
+    libc_name = ctypes.util.find_library('c')
+    if not libc_name:
+        return None
+    try:
+        return ctypes.CDLL(libc_name).malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+def _malloc_trim():
+    """Возвращает ОС свободную память кучи glibc (на других libc ничего не делает)"""
+    malloc_trim = _malloc_trim_func()
+    if malloc_trim is not None:
+        malloc_trim(0)
+
+def enforce_budget(budget_mb: float) -> bool:
+    """Если RSS превысил бюджет, собирает мусор и отдает память ОС; True при превышении.
+
+    Если после очистки RSS все еще выше бюджета, следующая очистка (и
+    предупреждение в логе) откладывается на 1, 2, 4... до MAX_BACKOFF_CYCLES циклов.
+    """
+    global _backoff, _skip_cycles
+
+    if budget_mb <= 0:
+        return False
+    rss_mb = rss_bytes() / 2 ** 20
+    if rss_mb <= budget_mb:
+        _backoff, _skip_cycles = 1, 0
+        return False
+    if _skip_cycles > 0:
+        _skip_cycles -= 1
+        return True
+
+    gc.collect()
+    _malloc_trim()
+    after_mb = rss_bytes() / 2 ** 20
+    if after_mb > budget_mb:
+        _skip_cycles = _backoff
+        _backoff = min(_backoff * 2, MAX_BACKOFF_CYCLES)
+    else:
+        _backoff = 1
+    logger.warning(
+        "RSS %.1f МБ превысил бюджет %.1f МБ, после очистки %.1f МБ; следующая очистка через %d циклов",
+        rss_mb, budget_mb, after_mb, _skip_cycles + 1,
+        extra={"rss_mb": round(rss_mb, 1), "budget_mb": budget_mb}
+    )
+    return True
@@ -0,0 +1,153 @@
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Ограничения, чтобы профилирование не раздувало память процесса
+MAX_PROFILE_CYCLES = 100
+MAX_DISTINCT_STACKS = 5000
+
+class StageProfiler:
+    """Поэтапные таймеры цикла мониторинга и захват стеков по запросу"""
+
+    def __init__(self, sample_interval: float = 0.005):
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._sampling = False
+        self._cycles: List[Dict[str, float]] = []
+        self._current: Optional[Dict[str, float]] = None
+        self._stacks: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self._target_thread: Optional[int] = None
+        self.last_report: Optional[dict] = None
+        self.last_folded: str = ""
+
+    @property
+    def active(self) -> bool:
+        """Идет ли профилируемый цикл в текущем потоке"""
+        return self._current is not None and threading.get_ident() == self._target_thread
+
+    @property
+    def pending(self) -> int:
+        """Сколько циклов еще осталось профилировать"""
+        return self._remaining
+
+    def request(self, cycles: int, sampling: bool = True) -> None:
+        """Включает профилирование следующих cycles циклов"""
+        with self._lock:
+            self._remaining = min(max(1, cycles), MAX_PROFILE_CYCLES)
+            self._sampling = sampling
+            self._cycles = []
+            self._stacks = Counter()
+
+    @contextmanager
+    def cycle(self):
+        """Оборачивает один цикл проверки; без запроса ничего не измеряет"""
+        with self._lock:
+            armed = self._remaining > 0 and self._current is None
+            if armed:
+                self._current = defaultdict(float)
+                self._target_thread = threading.get_ident()
+        if not armed:
+            yield
+            return
+
+        sampler = None
+        if self._sampling:
+            sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler = sampler
+            sampler.start()
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            total = time.perf_counter() - started
+            with self._lock:
+                current = self._current
+                self._current = None
+            if sampler is not None:
+                sampler.join()
+            current["total"] = total
+            self._finish_cycle(dict(current))
+
+    @contextmanager
+    def stage(self, name: str):
+        """Измеряет время этапа внутри профилируемого цикла"""
+        current = self._current
+        # Этапы других потоков (ручной /check, потоки обхода страниц) в отчет не попадают
+        if not self.active:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            current[name] += time.perf_counter() - started
+
+    def _finish_cycle(self, timings: Dict[str, float]) -> None:
+        with self._lock:
+            self._cycles.append(timings)
+            self._remaining -= 1
+            if self._remaining > 0:
+                return
+            self.last_report = self._build_report(self._cycles)
+            self.last_folded = "\n".join(
+                f"{stack} {count}" for stack, count in self._stacks.most_common()
+            )
+
+    def _sample_loop(self) -> None:
+        """Периодически снимает стек потока мониторинга"""
+        target = self._target_thread
+        while self._current is not None:
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stack = self._fold(frame)
+                if stack not in self._stacks and len(self._stacks) >= MAX_DISTINCT_STACKS:
+                    stack = "[other]"
+                self._stacks[stack] += 1
+            # Не держим ссылку на кадр между выборками
+            frame = None
+            time.sleep(self.sample_interval)
+
+    @staticmethod
+    def _fold(frame) -> str:
+        """Переводит стек в формат collapsed stacks для flamegraph.pl/speedscope"""
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(parts))
+
+    @staticmethod
+    def _build_report(cycles: List[Dict[str, float]]) -> dict:
+        stages = defaultdict(list)
+        for timings in cycles:
+            for name, value in timings.items():
+                stages[name].append(value)
+        return {
+            "cycles": len(cycles),
+            "stages": {
+                name: {
+                    "avg_ms": round(sum(values) / len(values) * 1000, 2),
+                    "max_ms": round(max(values) * 1000, 2),
+                }
+                for name, values in stages.items()
+            },
+        }
+
+    def format_report(self) -> str:
+        """Текстовая разбивка по этапам для Telegram"""
+        report = self.last_report
+        if report is None:
+            return "Нет данных профилирования"
+
+        lines = [f"Циклов: {report['cycles']}"]
+        for name, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["avg_ms"]):
+            lines.append(f"{name}: {stats['avg_ms']} мс (макс {stats['max_ms']} мс)")
+        return "\n".join(lines)
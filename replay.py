@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Запись и воспроизведение трафика монитора и Telegram-бота
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import signal
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import requests
+
+from lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+class TrafficRecorder:
+    """Пишет загруженные страницы и отправленные уведомления в сжатый архив.
+
+    События копятся в буфере и каждые flush_every штук дописываются отдельным
+    gzip-членом, поэтому при аварийном завершении теряется только хвост буфера,
+    а уже записанная часть архива остается читаемой.
+    """
+
+    def __init__(self, path: str, flush_every: int = 20):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self._truncate_incomplete_tail(path)
+        self._file = open(path, 'ab')
+        self._buffer: List[str] = []
+        self._closed = False
+        # RLock: close() из обработчика сигнала может прервать _write в том же потоке
+        self._lock = threading.RLock()
+        # Хеши недавних тел; вытесненное тело просто запишется повторно
+        self._bodies = LRUCache(256)
+        self._last_config: Optional[dict] = None
+
+    @staticmethod
+    def _truncate_incomplete_tail(path: str):
+        """Обрезает недописанный последний gzip-член, оставшийся после падения"""
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as archive:
+            data = archive.read()
+        complete = 0
+        while complete < len(data):
+            decompressor = zlib.decompressobj(wbits=31)
+            try:
+                decompressor.decompress(data[complete:])
+            except zlib.error:
+                break
+            if not decompressor.eof:
+                break
+            complete = len(data) - len(decompressor.unused_data)
+        if complete < len(data):
+            logger.warning("Архив %s обрезан после сбоя: отброшено %d байт", path, len(data) - complete)
+            with open(path, 'r+b') as archive:
+                archive.truncate(complete)
+
+    def _write(self, event: dict):
+        event["ts"] = time.time()
+        with self._lock:
+            if self._closed:
+                return
+            # Одинаковые тела страниц сохраняются один раз и дальше идут ссылкой по хешу
+            body = event.pop("body", None)
+            if body is not None:
+                digest = hashlib.sha1(body.encode()).hexdigest()
+                if digest not in self._bodies:
+                    self._bodies[digest] = True
+                    self._buffer.append(json.dumps({"type": "body", "sha": digest, "body": body}, ensure_ascii=False))
+                event["sha"] = digest
+            self._buffer.append(json.dumps(event, ensure_ascii=False))
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        """Дописывает буфер одним самостоятельным gzip-членом"""
+        if not self._buffer:
+            return
+        self._file.write(gzip.compress(("\n".join(self._buffer) + "\n").encode('utf-8')))
+        self._file.flush()
+        self._buffer = []
+
+    def record_config(self, monitor):
+        """Сохраняет настройки обхода, если они изменились с прошлой записи"""
+        config = {
+            "type": "config",
+            "target_url": monitor.target_url,
+            "search_names": monitor.search_names,
+            "page_template": monitor.page_template,
+            "max_pages": monitor.max_pages,
+            "page_concurrency": monitor.page_concurrency,
+            "stop_when_found": monitor.stop_when_found,
+        }
+        if config == self._last_config:
+            return
+        self._last_config = dict(config)
+        self._write(config)
+
+    def record_cycle(self):
+        """Отмечает начало цикла проверки"""
+        self._write({"type": "cycle"})
+
+    def record_page(self, url: str, response: requests.Response):
+        """Сохраняет ответ сервера"""
+        self._write({
+            "type": "page",
+            "url": url,
+            "status": response.status_code,
+            "headers": dict(response.headers),
+            "body": response.text,
+        })
+
+    def record_error(self, url: str, error: Exception):
+        """Сохраняет ошибку загрузки страницы"""
+        self._write({"type": "page", "url": url, "error": str(error)})
+
+    def record_message(self, chat_id, text: str):
+        """Сохраняет уведомление, отправленное в Telegram"""
+        self._write({"type": "message", "chat_id": str(chat_id), "text": text})
+
+    def install_signal_handler(self):
+        """Закрывает архив по SIGTERM до завершения процесса"""
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def handle(signum, frame):
+            self.close()
+            if callable(previous):
+                previous(signum, frame)
+            raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, handle)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._flush()
+            self._file.close()
+            self._closed = True
+
+def load_archive(path: str) -> List[dict]:
+    """Читает архив и подставляет тела страниц вместо ссылок на хеш.
+
+    Недописанный хвост (процесс убит во время записи) пропускается,
+    события до него возвращаются.
+    """
+    bodies = {}
+    events = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                event = json.loads(line)
+                if event["type"] == "body":
+                    bodies[event["sha"]] = event["body"]
+                    continue
+                if "sha" in event:
+                    body = bodies.get(event.pop("sha"))
+                    if body is None:
+                        continue
+                    event["body"] = body
+                events.append(event)
+    except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        logger.warning("Архив %s поврежден в конце (%s), прочитано событий: %d", path, e, len(events))
+    return events
+
+class ReplayTelegramClient:
+    """Заменяет Telegram-клиент: сохраняет сообщения вместо отправки"""
+
+    def __init__(self):
+        self.messages: List[dict] = []
+
+    async def send_message(self, chat_id, text: str, **kwargs):
+        self.messages.append({"chat_id": str(chat_id), "text": text})
+
+class TrafficReplayer:
+    """Прогоняет записанный трафик через цикл мониторинга бота"""
+
+    def __init__(self, events: List[dict], speed: float = 0, apply_recorded_names: bool = True):
+        self.speed = speed
+        self.apply_recorded_names = apply_recorded_names
+        self.cycles: List[Dict[str, dict]] = []
+        self.cycle_times: List[float] = []
+        # Имена, заданные админ-командами перед циклом (None - без изменений)
+        self.cycle_names: List[Optional[List[str]]] = []
+        self.recorded_messages = [event for event in events if event["type"] == "message"]
+        # Настройки обхода на момент записи (первая запись в архиве)
+        self.config = next((event for event in events if event["type"] == "config"), None)
+        self._position = -1
+        self._target_url: Optional[str] = None
+        self.client = ReplayTelegramClient()
+        self._group_cycles(events)
+
+    def _group_cycles(self, events: List[dict]):
+        """Делит страницы на циклы по меткам начала цикла.
+
+        В архивах без меток новый цикл начинается с каждой загрузки основной страницы.
+        """
+        pages = [event for event in events if event["type"] == "page"]
+        if not pages:
+            return
+        self._target_url = self.config["target_url"] if self.config else pages[0]["url"]
+        marked = any(event["type"] == "cycle" for event in events)
+        names = None
+        for event in events:
+            if event["type"] == "config":
+                names = event["search_names"]
+                continue
+            starts_cycle = event["type"] == "cycle" or (
+                not marked and event["type"] == "page" and (event["url"] == self._target_url or not self.cycles)
+            )
+            if starts_cycle:
+                self.cycles.append({})
+                self.cycle_times.append(event["ts"])
+                self.cycle_names.append(names)
+                names = None
+            if event["type"] == "page" and self.cycles:
+                self.cycles[-1].setdefault(event["url"], event)
+
+    def fetch_page_content(self, url: Optional[str] = None, missing_ok: bool = False) -> Optional[str]:
+        """Подменяет WebsiteMonitor.fetch_page_content"""
+        if not 0 <= self._position < len(self.cycles):
+            return None
+
+        page = self.cycles[self._position].get(url or self._target_url)
+        if missing_ok and page is not None and page.get("status") == 404:
+            return ""
+        if page is None or "error" in page or page["status"] >= 400:
+            return None
+        return page["body"]
+
+    @property
+    def exhausted(self) -> bool:
+        return self._position + 1 >= len(self.cycles)
+
+    def _sleep(self, bot, seconds: float):
+        """Пауза между циклами: записанный интервал, ускоренный в speed раз"""
+        if self.exhausted:
+            bot.is_running = False
+            return
+        if self.speed > 0:
+            gap = self.cycle_times[self._position + 1] - self.cycle_times[self._position]
+            time.sleep(max(0.0, gap) / self.speed)
+
+    def run(self, bot) -> dict:
+        """Прогоняет все циклы архива через bot._run_monitoring_loop"""
+        bot.monitor.fetch_page_content = self.fetch_page_content
+        # Цикл переключается в начале проверки: страницы цикла запрашиваются параллельно
+        check_for_names = bot.monitor.check_for_names
+
+        def replay_cycle():
+            self._position += 1
+            if self.apply_recorded_names and self._position < len(self.cycles):
+                names = self.cycle_names[self._position]
+                if names is not None:
+                    bot.monitor.set_search_names(names)
+            return check_for_names()
+
+        bot.monitor.check_for_names = replay_cycle
+        bot.monitor.target_url = self._target_url or bot.monitor.target_url
+        bot.application = SimpleNamespace(bot=self.client)
+        bot.shard = None
+        bot.recorder = None
+        bot._sleep = lambda seconds: self._sleep(bot, seconds)
+        bot.is_running = bool(self.cycles)
+
+        started = time.perf_counter()
+        bot._run_monitoring_loop()
+        elapsed = time.perf_counter() - started
+
+        recorded_span = self.cycle_times[-1] - self.cycle_times[0] if self.cycle_times else 0
+        return {
+            "cycles": len(self.cycles),
+            "recorded_seconds": round(recorded_span, 1),
+            "replay_seconds": round(elapsed, 3),
+            "cycles_per_second": round(len(self.cycles) / elapsed, 1) if elapsed else None,
+            "notifications": len(self.client.messages),
+            "recorded_notifications": len(self.recorded_messages),
+        }
+
+def main():
+    """Воспроизводит архив и печатает статистику (для сравнения версий)"""
+    parser = argparse.ArgumentParser(description="Воспроизведение записанного трафика")
+    parser.add_argument("archive", help="Путь к архиву, записанному с RECORD_TRAFFIC_PATH")
+    parser.add_argument("--bot", choices=["polling", "webhook"], default="polling",
+                        help="Какой бот прогонять: telegram_bot или telegram_bot_webhook")
+    parser.add_argument("--speed", type=float, default=0,
+                        help="Ускорение относительно записи (0 - без пауз)")
+    parser.add_argument("--names", default="", help="Имена через запятую (по умолчанию из архива или SEARCH_NAMES)")
+    parser.add_argument("--output", help="Куда сохранить уведомления в JSON для сравнения")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    from config import SEARCH_NAMES, TELEGRAM_USER_ID, PAGE_URL_TEMPLATE, MAX_PAGES, PAGE_CONCURRENCY, \
+        STOP_WHEN_FOUND
+    from website_monitor import WebsiteMonitor
+    if args.bot == "webhook":
+        from telegram_bot_webhook import WebhookMonitoringBot as bot_class
+    else:
+        from telegram_bot import MonitoringBot as bot_class
+
+    # Явный --names отключает смену имен по записанным админ-командам
+    replayer = TrafficReplayer(load_archive(args.archive), args.speed, apply_recorded_names=not args.names)
+    # Архивы без записи настроек воспроизводятся с текущим config.py
+    recorded = replayer.config or {
+        "search_names": SEARCH_NAMES,
+        "page_template": PAGE_URL_TEMPLATE,
+        "max_pages": MAX_PAGES,
+        "page_concurrency": PAGE_CONCURRENCY,
+        "stop_when_found": STOP_WHEN_FOUND,
+    }
+    names = args.names.split(',') if args.names else recorded["search_names"]
+    monitor = WebsiteMonitor(
+        recorded.get("target_url", ""), names, recorded["page_template"],
+        recorded["max_pages"], recorded["page_concurrency"], recorded["stop_when_found"]
+    )
+    bot = bot_class("", TELEGRAM_USER_ID or "0", monitor)
+    stats = replayer.run(bot)
+
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(replayer.client.messages, output, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Аренда опроса Telegram (getUpdates нельзя вызывать из нескольких процессов); ее получает
+# владелец цели, чтобы команды /profile и /stats попадали на реплику, которая ведет циклы
+UPDATES_KEY = "__telegram_updates__"
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+class ShardCoordinator:
+    """Распределяет цели между репликами через консистентное хеширование.
+
+    Реплики регистрируются в общем SQLite-файле и периодически обновляют
+    heartbeat. Реплика, не обновлявшая heartbeat дольше ttl, считается
+    выбывшей, и ее ключи автоматически переходят к оставшимся. Перед работой
+    с ключом реплика берет на него аренду (acquire), поэтому в момент смены
+    состава ключ не обслуживают две реплики сразу.
+    """
+
+    def __init__(self, db_path: str, replica_id: Optional[str] = None,
+                 heartbeat_seconds: float = 15, virtual_nodes: int = 64):
+        self.db_path = db_path
+        self.replica_id = replica_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_seconds = heartbeat_seconds
+        self.ttl = heartbeat_seconds * 3
+        self.virtual_nodes = virtual_nodes
+        self._ring: List[int] = []
+        self._ring_owners: List[str] = []
+        self._members: tuple = ()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._init_db()
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        """Транзакция; для записи блокировка берется сразу (BEGIN IMMEDIATE)"""
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS replicas (replica_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS flags (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, holder TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+
+    def _live_members(self, conn: sqlite3.Connection, now: float) -> tuple:
+        rows = conn.execute(
+            "SELECT replica_id FROM replicas WHERE last_seen >= ? ORDER BY replica_id",
+            (now - self.ttl,)
+        ).fetchall()
+        return tuple(row[0] for row in rows)
+
+    def heartbeat(self):
+        """Обновляет отметку жизни реплики и пересчитывает кольцо"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO replicas (replica_id, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(replica_id) DO UPDATE SET last_seen = excluded.last_seen",
+                (self.replica_id, now)
+            )
+            conn.execute("DELETE FROM replicas WHERE last_seen < ?", (now - self.ttl * 10,))
+            members = self._live_members(conn, now)
+        self._rebuild_ring(members)
+
+    def acquire(self, key: str, duration: Optional[float] = None, ring_key: Optional[str] = None,
+                release_if_lost: bool = True) -> bool:
+        """Берет или продлевает аренду ключа, если реплика им владеет.
+
+        Состав реплик перечитывается в той же транзакции, а аренда не дает
+        двум репликам с разным представлением о кольце работать с ключом
+        одновременно: новый владелец ждет, пока прежний ее отпустит или она
+        истечет. Аренду выбывшей реплики можно забрать сразу. ring_key -
+        ключ, по которому ищется владелец на кольце (по умолчанию сам key).
+        С release_if_lost=False потерянная аренда не удаляется: вызывающий
+        сначала останавливает работу с ключом, а затем вызывает release().
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            members = self._live_members(conn, now)
+            self._rebuild_ring(members)
+            if self.owner(ring_key or key) != self.replica_id:
+                if release_if_lost:
+                    conn.execute("DELETE FROM leases WHERE key = ? AND holder = ?", (key, self.replica_id))
+                return False
+
+            row = conn.execute("SELECT holder, expires FROM leases WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] != self.replica_id and row[1] >= now and row[0] in members:
+                return False
+            conn.execute(
+                "INSERT INTO leases (key, holder, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET holder = excluded.holder, expires = excluded.expires",
+                (key, self.replica_id, now + (duration or self.ttl))
+            )
+        return True
+
+    def release(self, key: str):
+        """Отпускает аренду ключа, если она у этой реплики"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND holder = ?", (key, self.replica_id))
+
+    def _rebuild_ring(self, members: tuple):
+        with self._lock:
+            if members == self._members:
+                return
+            points = sorted(
+                (_hash(f"{member}#{i}"), member)
+                for member in members
+                for i in range(self.virtual_nodes)
+            )
+            self._ring = [point for point, _ in points]
+            self._ring_owners = [member for _, member in points]
+            self._members = members
+        logger.info("Состав реплик изменился: %s", list(members), extra={"replicas": len(members)})
+
+    def owner(self, key: str) -> Optional[str]:
+        """Возвращает реплику, отвечающую за ключ"""
+        with self._lock:
+            if not self._ring:
+                return None
+            index = bisect.bisect(self._ring, _hash(key)) % len(self._ring)
+            return self._ring_owners[index]
+
+    def owns(self, key: str) -> bool:
+        """Отвечает ли текущая реплика за ключ"""
+        return self.owner(key) == self.replica_id
+
+    @property
+    def members(self) -> tuple:
+        return self._members
+
+    def get_flag(self, name: str, default: str = "") -> str:
+        """Читает общий для всех реплик флаг"""
+        with self._transaction(write=False) as conn:
+            row = conn.execute("SELECT value FROM flags WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_flag(self, name: str, value: str):
+        """Записывает общий для всех реплик флаг"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO flags (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
+
+    def update_flag(self, name: str, update: Callable[[str], str], default: str = "") -> str:
+        """Атомарно меняет флаг: чтение, update и запись в одной транзакции"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT value FROM flags WHERE name = ?", (name,)).fetchone()
+            value = update(row[0] if row else default)
+            conn.execute(
+                "INSERT INTO flags (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
+        return value
+
+    def start(self):
+        """Запускает фоновый heartbeat"""
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает heartbeat и освобождает ключи реплики"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM replicas WHERE replica_id = ?", (self.replica_id,))
+            conn.execute("DELETE FROM leases WHERE holder = ?", (self.replica_id,))
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                logger.error("Ошибка heartbeat реплики: %s", e)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест памяти: 10 000 циклов мониторинга на синтетических страницах
+"""
+import gc
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from log_config import setup_logging, shutdown_logging
+from memory import memory_stats
+from replay import ReplayTelegramClient, TrafficRecorder, TrafficReplayer
+from telegram_bot import MonitoringBot
+from website_monitor import WebsiteMonitor
+
+TARGET_URL = "http://soak.local/queue"
+PAGE_TEMPLATE = TARGET_URL + "?page={page}"
+# Заведомо меньше RSS: enforce_budget срабатывает постоянно (с backoff)
+MEMORY_BUDGET_MB = 1
+TOTAL_CYCLES = 10000
+WARMUP_CYCLES = 1000
+MAX_RSS_GROWTH_MB = 5
+MAX_OBJECTS_GROWTH = 1000
+
+class CountingTelegramClient(ReplayTelegramClient):
+    """Считает уведомления, не храня их, чтобы сам тест не занимал память"""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = 0
+
+    async def send_message(self, chat_id, text: str, **kwargs):
+        self.sent += 1
+
+def make_page(variant: int, rows: range = range(50)) -> str:
+    """Страница очереди (по умолчанию 50 строк); статус искомой машины меняется от варианта к варианту"""
+    cells = []
+    for i in rows:
+        status = f"{variant % 24:02d}:{i % 60:02d}" if i == variant % 50 else " : "
+        name = "Иван Иванов" if i == 25 else f"Водитель {variant}-{i}"
+        cells.append(f"<tr><td>{i}</td><td>A{i}</td><td>B{i}</td><td>{status}</td><td>{name}</td><td>C</td></tr>")
+    return f"<html><title>Очередь</title><table>{''.join(cells)}</table></html>"
+
+def make_events(cycles: int) -> list:
+    pages = [make_page(variant) for variant in range(50)]
+    return [
+        {"type": "page", "url": TARGET_URL, "status": 200, "ts": float(i), "body": pages[i % len(pages)]}
+        for i in range(cycles)
+    ]
+
+def make_crawl_events(cycles: int) -> list:
+    """Таблица на двух страницах, третьей нет (404): обход останавливается во второй волне"""
+    first = [make_page(variant, range(25)) for variant in range(50)]
+    second = [make_page(variant, range(25, 50)) for variant in range(50)]
+    events = []
+    for i in range(cycles):
+        events += [
+            {"type": "cycle", "ts": float(i)},
+            {"type": "page", "url": TARGET_URL, "status": 200, "ts": float(i), "body": first[i % 50]},
+            {"type": "page", "url": PAGE_TEMPLATE.format(page=2), "status": 200, "ts": float(i), "body": second[i % 50]},
+            {"type": "page", "url": PAGE_TEMPLATE.format(page=3), "status": 404, "ts": float(i), "body": ""},
+        ]
+    return events
+
+class RecordingReplayer(TrafficReplayer):
+    """Воспроизведение, заново записывающее загруженные страницы через TrafficRecorder"""
+
+    def __init__(self, events: list, recorder: TrafficRecorder):
+        super().__init__(events)
+        self.recorder = recorder
+
+    def fetch_page_content(self, url=None, missing_ok=False):
+        content = super().fetch_page_content(url, missing_ok)
+        if 0 <= self._position < len(self.cycles):
+            page = self.cycles[self._position].get(url or self._target_url)
+            if page is not None:
+                response = SimpleNamespace(status_code=page["status"], headers={}, text=page["body"])
+                self.recorder.record_page(page["url"], response)
+        return content
+
+def run_cycles(bot: MonitoringBot, replayer: TrafficReplayer) -> float:
+    replayer.client = CountingTelegramClient()
+    started = time.perf_counter()
+    replayer.run(bot)
+    elapsed = time.perf_counter() - started
+    # Бот держит ссылки на воспроизведение; отвязываем, чтобы архив не попал в замер
+    bot.application = None
+    bot._sleep = bot._interruptible_sleep
+    del bot.monitor.fetch_page_content
+    del bot.monitor.check_for_names
+    return elapsed
+
+def soak(title: str, bot: MonitoringBot, make_replayer) -> bool:
+    """Прогоняет циклы и проверяет, что память не растет после прогрева"""
+    print(title)
+    # tracemalloc замедляет разбор страниц в десятки раз, поэтому следим
+    # за числом живых объектов и RSS
+    run_cycles(bot, make_replayer(WARMUP_CYCLES))
+    gc.collect()
+    baseline_objects = len(gc.get_objects())
+    baseline_rss = memory_stats()["rss_mb"]
+
+    elapsed = run_cycles(bot, make_replayer(TOTAL_CYCLES - WARMUP_CYCLES))
+    gc.collect()
+    objects = len(gc.get_objects())
+    stats = memory_stats()
+
+    rss_growth = stats["rss_mb"] - baseline_rss
+    print(f"Циклов: {bot.stats['cycles']} за {elapsed:.1f} с")
+    print(f"Объектов: после прогрева {baseline_objects}, в конце {objects}")
+    print(f"RSS: после прогрева {baseline_rss} МБ, в конце {stats['rss_mb']} МБ (пик {stats['peak_rss_mb']} МБ)")
+
+    if bot.stats['cycles'] != TOTAL_CYCLES:
+        print(f"❌ Выполнено {bot.stats['cycles']} циклов вместо {TOTAL_CYCLES}")
+        return False
+    if objects - baseline_objects > MAX_OBJECTS_GROWTH or rss_growth > MAX_RSS_GROWTH_MB:
+        print("❌ Память растет")
+        return False
+    print("✅ Память стабильна")
+    return True
+
+def main():
+    """Одна страница; обход по шаблону с бюджетом памяти и записью трафика"""
+    # Предупреждения enforce_budget при бюджете ниже RSS шли бы каждые несколько циклов
+    setup_logging('ERROR')
+    ok = soak("Одна страница", MonitoringBot("", "1", WebsiteMonitor(TARGET_URL, ["Иванов"])),
+              lambda cycles: TrafficReplayer(make_events(cycles)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recorder = TrafficRecorder(os.path.join(tmp, "soak.jsonl.gz"))
+        monitor = WebsiteMonitor(TARGET_URL, ["Иванов"], PAGE_TEMPLATE, max_pages=4, page_concurrency=2)
+        monitor.recorder = recorder
+        bot = MonitoringBot("", "1", monitor)
+        bot.memory_budget_mb = MEMORY_BUDGET_MB
+        ok = soak("Обход страниц, бюджет памяти, запись трафика", bot,
+                  lambda cycles: RecordingReplayer(make_crawl_events(cycles), recorder)) and ok
+        recorder.close()
+
+    shutdown_logging()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
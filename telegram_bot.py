@@ -2,21 +2,41 @@ import logging
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 from website_monitor import WebsiteMonitor
+from sharding import ShardCoordinator
+from memory import enforce_budget
+from bot_admin import AdminCommandsMixin
 import asyncio
 import schedule
 import time
-from threading import Thread
-from typing import List
+from threading import Event, Thread
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
-class MonitoringBot:
-    def __init__(self, bot_token: str, user_id: str, monitor: WebsiteMonitor):
+class MonitoringBot(AdminCommandsMixin):
+    def __init__(self, bot_token: str, user_id: str, monitor: WebsiteMonitor,
+                 shard: Optional[ShardCoordinator] = None, check_interval_minutes: int = 10):
         self.bot_token = bot_token
         self.user_id = user_id
         self.monitor = monitor
+        self.shard = shard
         self.application = None
         self.is_running = False
+        self.check_interval_minutes = check_interval_minutes
+        self._wakeup = Event()
+        self.stats = {
+            "started_at": time.time(),
+            "cycles": 0,
+            "notifications": 0,
+            "errors": 0,
+            "last_cycle_seconds": None,
+            "last_found": 0,
+        }
+        # Запись уведомлений (replay.TrafficRecorder) и пауза цикла, подменяемая при воспроизведении
+        self.recorder = None
+        self._sleep = self._interruptible_sleep
+        # Бюджет RSS в МБ; 0 - без ограничения
+        self.memory_budget_mb = 0
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -26,7 +46,11 @@ class MonitoringBot:
             "/status - Проверить текущий статус\n"
             "/check - Выполнить проверку сейчас\n"
             "/stop - Остановить мониторинг\n"
-            "/start_monitoring - Запустить автоматический мониторинг"
+            "/start_monitoring - Запустить автоматический мониторинг\n"
+            "/profile [N] - Профилировать следующие N циклов (админ)\n"
+            "/add_name, /remove_name - Изменить список имен (админ)\n"
+            "/interval [минуты] - Интервал проверки (админ)\n"
+            "/targets, /stats - Цели и статистика (админ)"
         )
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -37,13 +61,14 @@ class MonitoringBot:
                 await update.message.reply_text(f"❌ Ошибка: {page_info['error']}")
                 return
             
+            monitoring_active = await self._monitoring_active()
             status_text = (
                 f"📊 Статус мониторинга:\n\n"
                 f"🌐 Сайт: {page_info['url']}\n"
                 f"📄 Заголовок: {page_info['title']}\n"
                 f"📏 Размер страницы: {page_info['content_length']} символов\n"
                 f"🔍 Ищем: {', '.join(page_info['search_names'])}\n"
-                f"🔄 Мониторинг: {'Активен' if self.is_running else 'Остановлен'}"
+                f"🔄 Мониторинг: {'Активен' if monitoring_active else 'Остановлен'}"
             )
             await update.message.reply_text(status_text)
         except Exception as e:
@@ -86,19 +111,32 @@ class MonitoringBot:
     
     async def start_monitoring_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start_monitoring"""
+        if self.shard is not None:
+            # В режиме шардирования цикл уже запущен на всех репликах, переключаем общий флаг
+            await asyncio.to_thread(self.shard.set_flag, "monitoring", "1")
+            await update.message.reply_text(
+                f"🚀 Мониторинг запущен на {len(self.shard.members)} репликах!"
+            )
+            return
+        
         if self.is_running:
             await update.message.reply_text("🔄 Мониторинг уже запущен!")
             return
         
         self.is_running = True
-        await update.message.reply_text("🚀 Мониторинг запущен! Бот будет проверять сайт каждые 10 минут.")
+        await update.message.reply_text(f"🚀 Мониторинг запущен! Бот будет проверять сайт каждые {self.check_interval_minutes} минут.")
         
         # Запускаем мониторинг в отдельном потоке
         Thread(target=self._run_monitoring_loop, daemon=True).start()
     
     async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /stop"""
-        self.is_running = False
+        if self.shard is not None:
+            await asyncio.to_thread(self.shard.set_flag, "monitoring", "0")
+        else:
+            self.is_running = False
+            # Будим цикл, чтобы поток завершился сразу, а не после паузы
+            self._wakeup.set()
         await update.message.reply_text("⏹️ Мониторинг остановлен!")
     
     async def send_notification(self, found_names: List[str]):
@@ -124,37 +162,57 @@ class MonitoringBot:
         )
         
         try:
-            await self.application.bot.send_message(
-                chat_id=self.user_id,
-                text=message
-            )
-            logger.info(f"Отправлено уведомление о найденных именах: {found_names}")
+            with self.monitor.profiler.stage("telegram_send"):
+                await self.application.bot.send_message(
+                    chat_id=self.user_id,
+                    text=message
+                )
+            if self.recorder is not None:
+                self.recorder.record_message(self.user_id, message)
+            self.stats["notifications"] += 1
+            logger.info("Отправлено уведомление: %d имен", len(found_names), extra={"found": len(found_names)})
         except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления: {e}")
+            logger.error("Ошибка при отправке уведомления: %s", e)
     
     def _run_monitoring_loop(self):
         """Запускает цикл мониторинга в отдельном потоке"""
         while self.is_running:
             try:
-                found_names = self.monitor.check_for_names()
+                # Обращения к SQLite тоже под try: ошибка БД не должна останавливать поток
+                # Настройки подхватывают и реплики без цели: команды могут прийти на любую
+                self._sync_shared_settings()
+                if not self._owns_target():
+                    # Цель обслуживает другая реплика; проверяем снова после heartbeat
+                    self._sleep(self.shard.heartbeat_seconds)
+                    continue
+                
+                cycle_started = time.monotonic()
+                with self.monitor.profiler.cycle():
+                    found_names = self.monitor.check_for_names()
+                    
+                    # Отправляем уведомление если найдены имена
+                    if found_names:
+                        # Создаем новый event loop для асинхронной операции
+                        try:
+                            loop = asyncio.new_event_loop()
+                            asyncio.set_event_loop(loop)
+                            loop.run_until_complete(self.send_notification(found_names))
+                            loop.close()
+                        except Exception as e:
+                            logger.error("Ошибка при отправке уведомления: %s", e)
                 
-                # Отправляем уведомление если найдены имена
-                if found_names:
-                    # Создаем новый event loop для асинхронной операции
-                    try:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        loop.run_until_complete(self.send_notification(found_names))
-                        loop.close()
-                    except Exception as e:
-                        logger.error(f"Ошибка при отправке уведомления: {e}")
+                self.stats["cycles"] += 1
+                self.stats["last_cycle_seconds"] = time.monotonic() - cycle_started
+                self.stats["last_found"] = len(found_names)
+                enforce_budget(self.memory_budget_mb)
                 
                 # Ждем перед следующей проверкой
-                time.sleep(600)  # 10 минут
+                self._wait_next_cycle(cycle_started)
                 
             except Exception as e:
-                logger.error(f"Ошибка в цикле мониторинга: {e}")
-                time.sleep(60)  # Ждем минуту при ошибке
+                logger.error("Ошибка в цикле мониторинга: %s", e)
+                self.stats["errors"] += 1
+                self._sleep(60)  # Ждем минуту при ошибке
     
     async def setup_handlers(self):
         """Настраивает обработчики команд"""
@@ -163,6 +221,7 @@ class MonitoringBot:
         self.application.add_handler(CommandHandler("check", self.check_command))
         self.application.add_handler(CommandHandler("start_monitoring", self.start_monitoring_command))
         self.application.add_handler(CommandHandler("stop", self.stop_command))
+        self._add_admin_handlers()
     
     async def run(self):
         """Запускает бота"""
@@ -171,7 +230,19 @@ class MonitoringBot:
             await self.setup_handlers()
             
             logger.info("Бот запущен!")
-            await self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+            if self.shard is None:
+                await self.application.run_polling(allowed_updates=Update.ALL_TYPES)
+                return
+            
+            # В режиме шардирования цикл мониторинга работает на каждой реплике,
+            # а getUpdates вызывает только одна из них
+            self.is_running = True
+            Thread(target=self._run_sharded_monitoring_loop, daemon=True).start()
+            await self.application.initialize()
+            await self.application.start()
+            while True:
+                await self._sync_updates_polling()
+                await asyncio.sleep(self.shard.heartbeat_seconds)
         except Exception as e:
             logger.error(f"Ошибка при запуске бота: {e}")
             raise 
\ No newline at end of file
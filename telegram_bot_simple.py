@@ -87,13 +87,13 @@ class SimpleMonitoringBot:
                 # Отправляем уведомление если найдены имена
                 if found_names:
                     # Простая отправка уведомления без сложной асинхронной логики
-                    logger.info(f"Найдены имена: {found_names}")
+                    logger.info("Найдены имена: %d", len(found_names))
                 
                 # Ждем перед следующей проверкой
                 time.sleep(600)  # 10 минут
                 
             except Exception as e:
-                logger.error(f"Ошибка в цикле мониторинга: {e}")
+                logger.error("Ошибка в цикле мониторинга: %s", e)
                 time.sleep(60)  # Ждем минуту при ошибке
     
     async def setup_handlers(self):
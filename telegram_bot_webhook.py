@@ -3,19 +3,39 @@ import asyncio
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 from website_monitor import WebsiteMonitor
+from sharding import ShardCoordinator
+from memory import enforce_budget
+from bot_admin import AdminCommandsMixin
 import time
-from threading import Thread
-from typing import List
+from threading import Event, Thread
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
-class WebhookMonitoringBot:
-    def __init__(self, bot_token: str, user_id: str, monitor: WebsiteMonitor):
+class WebhookMonitoringBot(AdminCommandsMixin):
+    def __init__(self, bot_token: str, user_id: str, monitor: WebsiteMonitor,
+                 shard: Optional[ShardCoordinator] = None, check_interval_minutes: int = 10):
         self.bot_token = bot_token
         self.user_id = user_id
         self.monitor = monitor
+        self.shard = shard
         self.application = None
         self.is_running = False
+        self.check_interval_minutes = check_interval_minutes
+        self._wakeup = Event()
+        self.stats = {
+            "started_at": time.time(),
+            "cycles": 0,
+            "notifications": 0,
+            "errors": 0,
+            "last_cycle_seconds": None,
+            "last_found": 0,
+        }
+        # Запись уведомлений (replay.TrafficRecorder) и пауза цикла, подменяемая при воспроизведении
+        self.recorder = None
+        self._sleep = self._interruptible_sleep
+        # Бюджет RSS в МБ; 0 - без ограничения
+        self.memory_budget_mb = 0
     
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start"""
@@ -25,7 +45,11 @@ class WebhookMonitoringBot:
             "/status - Проверить текущий статус\n"
             "/check - Выполнить проверку сейчас\n"
             "/stop - Остановить мониторинг\n"
-            "/start_monitoring - Запустить автоматический мониторинг"
+            "/start_monitoring - Запустить автоматический мониторинг\n"
+            "/profile [N] - Профилировать следующие N циклов (админ)\n"
+            "/add_name, /remove_name - Изменить список имен (админ)\n"
+            "/interval [минуты] - Интервал проверки (админ)\n"
+            "/targets, /stats - Цели и статистика (админ)"
         )
     
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -36,13 +60,14 @@ class WebhookMonitoringBot:
                 await update.message.reply_text(f"❌ Ошибка: {page_info['error']}")
                 return
             
+            monitoring_active = await self._monitoring_active()
             status_text = (
                 f"📊 Статус мониторинга:\n\n"
                 f"🌐 Сайт: {page_info['url']}\n"
                 f"📄 Заголовок: {page_info['title']}\n"
                 f"📏 Размер страницы: {page_info['content_length']} символов\n"
                 f"🔍 Ищем: {', '.join(page_info['search_names'])}\n"
-                f"🔄 Мониторинг: {'Активен' if self.is_running else 'Остановлен'}"
+                f"🔄 Мониторинг: {'Активен' if monitoring_active else 'Остановлен'}"
             )
             await update.message.reply_text(status_text)
         except Exception as e:
@@ -83,69 +108,101 @@ class WebhookMonitoringBot:
     
     async def start_monitoring_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /start_monitoring"""
+        if self.shard is not None:
+            # В режиме шардирования цикл уже запущен на всех репликах, переключаем общий флаг
+            await asyncio.to_thread(self.shard.set_flag, "monitoring", "1")
+            await update.message.reply_text(
+                f"🚀 Мониторинг запущен на {len(self.shard.members)} репликах!"
+            )
+            return
+        
         if self.is_running:
             await update.message.reply_text("🔄 Мониторинг уже запущен!")
             return
         
         self.is_running = True
-        await update.message.reply_text("🚀 Мониторинг запущен! Бот будет проверять сайт каждые 10 минут.")
+        await update.message.reply_text(f"🚀 Мониторинг запущен! Бот будет проверять сайт каждые {self.check_interval_minutes} минут.")
         
         # Запускаем мониторинг в отдельном потоке
         Thread(target=self._run_monitoring_loop, daemon=True).start()
     
     async def stop_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /stop"""
-        self.is_running = False
+        if self.shard is not None:
+            await asyncio.to_thread(self.shard.set_flag, "monitoring", "0")
+        else:
+            self.is_running = False
+            # Будим цикл, чтобы поток завершился сразу, а не после паузы
+            self._wakeup.set()
         await update.message.reply_text("⏹️ Мониторинг остановлен!")
     
     def _run_monitoring_loop(self):
         """Запускает цикл мониторинга в отдельном потоке"""
         while self.is_running:
             try:
-                found_names = self.monitor.check_for_names()
+                # Обращения к SQLite тоже под try: ошибка БД не должна останавливать поток
+                # Настройки подхватывают и реплики без цели: команды могут прийти на любую
+                self._sync_shared_settings()
+                if not self._owns_target():
+                    # Цель обслуживает другая реплика; проверяем снова после heartbeat
+                    self._sleep(self.shard.heartbeat_seconds)
+                    continue
                 
-                # Отправляем уведомление ТОЛЬКО если машина выехала
-                if found_names:
-                    logger.info(f"Найдены имена: {found_names}")
+                cycle_started = time.monotonic()
+                with self.monitor.profiler.cycle():
+                    found_names = self.monitor.check_for_names()
+                
+                    # Отправляем уведомление ТОЛЬКО если машина выехала
+                    if found_names:
                     
-                    # Проверяем, есть ли статус "ВЫЕХАЛА"
-                    has_exit = any("ВЫЕХАЛА" in name for name in found_names)
+                        # Проверяем, есть ли статус "ВЫЕХАЛА"
+                        has_exit = any("ВЫЕХАЛА" in name for name in found_names)
                     
-                    if has_exit:
-                        # Отправляем уведомление только при выезде
-                        try:
-                            import asyncio
-                            loop = asyncio.new_event_loop()
-                            asyncio.set_event_loop(loop)
+                        if has_exit:
+                            # Отправляем уведомление только при выезде
+                            try:
+                                import asyncio
+                                loop = asyncio.new_event_loop()
+                                asyncio.set_event_loop(loop)
                             
-                            async def send_notification():
-                                message = (
-                                    f"🚗 УРА! ВАША МАШИНА ВЫЕХАЛА ИЗ ТАМОЖНИ!\n\n"
-                                    f"📝 Статус:\n" + "\n".join(found_names) + f"\n\n"
-                                    f"🌐 Сайт: {self.monitor.target_url}\n"
-                                    f"⏰ Время обнаружения: {time.strftime('%Y-%m-%d %H:%M:%S')}"
-                                )
+                                async def send_notification():
+                                    message = (
+                                        f"🚗 УРА! ВАША МАШИНА ВЫЕХАЛА ИЗ ТАМОЖНИ!\n\n"
+                                        f"📝 Статус:\n" + "\n".join(found_names) + f"\n\n"
+                                        f"🌐 Сайт: {self.monitor.target_url}\n"
+                                        f"⏰ Время обнаружения: {time.strftime('%Y-%m-%d %H:%M:%S')}"
+                                    )
                                 
-                                await self.application.bot.send_message(
-                                    chat_id=self.user_id,
-                                    text=message
-                                )
+                                    with self.monitor.profiler.stage("telegram_send"):
+                                        await self.application.bot.send_message(
+                                            chat_id=self.user_id,
+                                            text=message
+                                        )
+                                    if self.recorder is not None:
+                                        self.recorder.record_message(self.user_id, message)
+                                    self.stats["notifications"] += 1
                             
-                            loop.run_until_complete(send_notification())
-                            loop.close()
+                                loop.run_until_complete(send_notification())
+                                loop.close()
                             
-                        except Exception as e:
-                            logger.error(f"Ошибка при отправке уведомления: {e}")
-                    else:
-                        # Логируем, но не отправляем уведомление
-                        logger.info(f"Имя найдено, но машина еще не выехала: {found_names}")
+                            except Exception as e:
+                                logger.error("Ошибка при отправке уведомления: %s", e)
+                        else:
+                            # Логируем, но не отправляем уведомление
+                            logger.info("Имя найдено, но машина еще не выехала: %d строк", len(found_names))
+                
+                self.stats["cycles"] += 1
+                self.stats["last_cycle_seconds"] = time.monotonic() - cycle_started
+                self.stats["last_found"] = len(found_names)
+                enforce_budget(self.memory_budget_mb)
                 
                 # Ждем перед следующей проверкой
-                time.sleep(600)  # 10 минут
+                self._wait_next_cycle(cycle_started)
                 
             except Exception as e:
-                logger.error(f"Ошибка в цикле мониторинга: {e}")
-                time.sleep(60)  # Ждем минуту при ошибке
+                logger.error("Ошибка в цикле мониторинга: %s", e)
+                self.stats["errors"] += 1
+                self._sleep(60)  # Ждем минуту при ошибке
     
     async def setup_handlers(self):
         """Настраивает обработчики команд"""
@@ -154,6 +211,7 @@ class WebhookMonitoringBot:
         self.application.add_handler(CommandHandler("check", self.check_command))
         self.application.add_handler(CommandHandler("start_monitoring", self.start_monitoring_command))
         self.application.add_handler(CommandHandler("stop", self.stop_command))
+        self._add_admin_handlers()
     
     async def run(self):
         """Запускает бота"""
@@ -163,14 +221,20 @@ class WebhookMonitoringBot:
             
             logger.info("Бот запущен!")
             
+            if self.shard is not None:
+                # Цикл мониторинга работает на каждой реплике, цели делятся по шардам
+                self.is_running = True
+                Thread(target=self._run_sharded_monitoring_loop, daemon=True).start()
+            
             # Используем простой polling
             await self.application.initialize()
             await self.application.start()
-            await self.application.updater.start_polling()
+            await self._sync_updates_polling()
             
             # Ждем завершения через бесконечный цикл
             while True:
-                await asyncio.sleep(1)
+                await asyncio.sleep(1 if self.shard is None else self.shard.heartbeat_seconds)
+                await self._sync_updates_polling()
             
         except Exception as e:
             logger.error(f"Ошибка при запуске бота: {e}")
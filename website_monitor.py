@@ -1,64 +1,242 @@
 import requests
 from bs4 import BeautifulSoup
 import logging
-from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+import socket
+import threading
 import time
+from profiler import StageProfiler
 
 logger = logging.getLogger(__name__)
 
 class WebsiteMonitor:
-    def __init__(self, target_url: str, search_names: List[str]):
+    def __init__(self, target_url: str, search_names: List[str], page_template: str = '',
+                 max_pages: int = 1, page_concurrency: int = 4, stop_when_found: bool = False):
         self.target_url = target_url
-        self.search_names = [name.strip() for name in search_names if name.strip()]
+        self._names_lock = threading.Lock()
+        self.set_search_names(search_names)
+        # Обход нескольких страниц: шаблон URL с {page} или поиск ссылок пагинации
+        self.page_template = page_template
+        self.max_pages = max(1, max_pages)
+        self.page_concurrency = max(1, page_concurrency)
+        self.stop_when_found = stop_when_found
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.page_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        self.profiler = StageProfiler()
+        # Запись загруженных страниц (replay.TrafficRecorder)
+        self.recorder = None
     
-    def fetch_page_content(self) -> Optional[str]:
-        """Получает содержимое страницы"""
+    def fetch_page_content(self, url: Optional[str] = None, missing_ok: bool = False) -> Optional[str]:
+        """Получает содержимое страницы (по умолчанию - target_url); с missing_ok на 404 - пустая строка"""
+        url = url or self.target_url
         try:
-            response = self.session.get(self.target_url, timeout=30)
-            response.raise_for_status()
-            return response.text
-        except requests.RequestException as e:
-            logger.error(f"Ошибка при получении страницы: {e}")
+            if self.profiler.active:
+                # Отдельный резолв только в профилируемом потоке, чтобы увидеть время DNS
+                parts = urlsplit(url)
+                with self.profiler.stage("dns"):
+                    socket.getaddrinfo(parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+            with self.profiler.stage("download"):
+                response = self.session.get(url, timeout=30)
+                if self.recorder is not None:
+                    self.recorder.record_page(url, response)
+                response.raise_for_status()
+                return response.text
+        except (requests.RequestException, OSError) as e:
+            if self.recorder is not None and not isinstance(e, requests.HTTPError):
+                self.recorder.record_error(url, e)
+            if missing_ok and isinstance(e, requests.HTTPError) and e.response.status_code == 404:
+                # Страница за последней при обходе по шаблону - ожидаемо
+                logger.debug("Страница не найдена: %s", url)
+                return ""
+            logger.error("Ошибка при получении страницы: %s", e, extra={"url": url})
             return None
     
+    def set_search_names(self, search_names: List[str]) -> None:
+        """Атомарно заменяет список искомых имен и подготовленный матчер"""
+        names = tuple(dict.fromkeys(name.strip() for name in search_names if name.strip()))
+        # Одно присваивание кортежа - циклы в других потоках видят либо старый, либо новый набор
+        self._names_state = (names, tuple(name.lower() for name in names))
+    
+    @property
+    def search_names(self) -> List[str]:
+        return list(self._names_state[0])
+    
+    @property
+    def _matcher(self) -> tuple:
+        return self._names_state[1]
+    
+    def add_search_name(self, name: str) -> bool:
+        """Добавляет имя в поиск; False, если оно уже есть"""
+        name = name.strip()
+        with self._names_lock:
+            if not name or name in self._names_state[0]:
+                return False
+            self.set_search_names(self.search_names + [name])
+        return True
+    
+    def remove_search_name(self, name: str) -> bool:
+        """Убирает имя из поиска; False, если его не было"""
+        name = name.strip()
+        with self._names_lock:
+            if name not in self._names_state[0]:
+                return False
+            self.set_search_names([existing for existing in self.search_names if existing != name])
+        return True
+    
     def search_names_in_content(self, content: str) -> List[str]:
         """Ищет имена в содержимом страницы и проверяет статус выезда"""
-        soup = BeautifulSoup(content, 'html.parser')
+        with self.profiler.stage("parse"):
+            soup = BeautifulSoup(content, 'html.parser')
         
+        with self.profiler.stage("search"):
+            found_names = self._search_names_in_soup(soup)
+        # Дерево разбора держит ссылки на все узлы страницы - освобождаем его сразу
+        soup.decompose()
+        return found_names
+    
+    def _search_names_in_soup(self, soup: BeautifulSoup) -> List[str]:
+        """Ищет имена в разобранной странице"""
+        return self._match_rows(self._extract_rows(soup))
+    
+    def _extract_rows(self, soup: BeautifulSoup) -> List[Tuple[str, ...]]:
+        """Извлекает текст всех ячеек строк таблиц страницы"""
+        extracted = []
+        # Ищем таблицы на странице
+        for table in soup.find_all('table'):
+            for row in table.find_all('tr'):
+                cells = row.find_all(['td', 'th'])
+                if len(cells) >= 6:  # Проверяем, что есть минимум 6 ячеек
+                    # Вся строка целиком нужна, чтобы при обходе страниц отличать
+                    # разные машины с одинаковыми именем и статусом
+                    extracted.append(tuple(cell.get_text().strip() for cell in cells))
+        return extracted
+    
+    def _match_rows(self, rows: List[Tuple[str, ...]]) -> List[str]:
+        """Проверяет строки таблицы на совпадение с искомыми именами"""
         found_names = []
-        for search_name in self.search_names:
-            search_name_lower = search_name.lower()
-            
-            # Ищем таблицы на странице
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    if len(cells) >= 6:  # Проверяем, что есть минимум 6 ячеек
-                        # 5-я ячейка (индекс 4) - имя
-                        name_cell = cells[4].get_text().strip()
-                        # 4-я ячейка (индекс 3) - статус выезда
-                        status_cell = cells[3].get_text().strip()
-                        
-                        # Проверяем, содержит ли 5-я ячейка искомое имя
-                        if search_name_lower in name_cell.lower():
-                            # Проверяем статус в 4-й ячейке
-                            if status_cell != " : " and ":" in status_cell and len(status_cell) > 3:
-                                # Машина выехала!
-                                found_names.append(f"{name_cell} - ВЫЕХАЛА: {status_cell}")
-                                logger.info(f"Машина выехала! {name_cell} - {status_cell}")
-                            else:
-                                # Имя найдено, но машина еще не выехала
-                                found_names.append(f"{name_cell} - ОЖИДАЕТ: {status_cell}")
-                                logger.info(f"Имя найдено, но машина не выехала: {name_cell} - {status_cell}")
+        departed = 0
+        # Снимок матчера на весь цикл: изменения из админ-команд применятся со следующего цикла
+        for search_name_lower in self._matcher:
+            for row in rows:
+                # 5-я ячейка (индекс 4) - имя, 4-я ячейка (индекс 3) - статус выезда
+                name_cell, status_cell = row[4], row[3]
+                # Проверяем, содержит ли 5-я ячейка искомое имя
+                if search_name_lower in name_cell.lower():
+                    # Проверяем статус в 4-й ячейке
+                    if status_cell != " : " and ":" in status_cell and len(status_cell) > 3:
+                        # Машина выехала!
+                        found_names.append(f"{name_cell} - ВЫЕХАЛА: {status_cell}")
+                        departed += 1
+                    else:
+                        # Имя найдено, но машина еще не выехала
+                        found_names.append(f"{name_cell} - ОЖИДАЕТ: {status_cell}")
         
+        # Одна сводная запись за цикл вместо строки на каждую найденную строку таблицы
+        logger.info(
+            "Проверка завершена: найдено %d, выехало %d",
+            len(found_names), departed,
+            extra={"found": len(found_names), "departed": departed, "sample": True}
+        )
+        logger.debug("Найденные строки: %s", found_names)
         return found_names
     
+    def _all_names_present(self, rows: List[Tuple[str, ...]]) -> bool:
+        """Все ли искомые имена уже встретились в строках"""
+        remaining = set(self._matcher)
+        for row in rows:
+            name_lower = row[4].lower()
+            remaining = {name for name in remaining if name not in name_lower}
+            if not remaining:
+                return True
+        return False
+    
+    def _discover_page_urls(self, soup: BeautifulSoup) -> List[str]:
+        """Находит ссылки пагинации (ссылки с номером страницы в тексте)"""
+        numbered = {}
+        for link in soup.find_all('a', href=True):
+            text = link.get_text().strip()
+            if text.isdigit() and int(text) > 1:
+                numbered.setdefault(int(text), urljoin(self.target_url, link['href']))
+        return [numbered[number] for number in sorted(numbered)][:self.max_pages - 1]
+    
+    def _template_urls(self) -> Iterator[str]:
+        """Все URL по шаблону, начиная с основной страницы"""
+        yield self.target_url
+        for page in range(2, self.max_pages + 1):
+            yield self.page_template.format(page=page)
+    
+    def _fetch_crawl_page(self, url: str) -> Optional[str]:
+        """Загрузка страницы при обходе: 404 ожидаем только за последней страницей"""
+        return self.fetch_page_content(url, missing_ok=url != self.target_url)
+    
+    def _crawl_rows(self) -> Optional[List[Tuple[str, ...]]]:
+        """Загружает все страницы таблицы параллельно и объединяет строки"""
+        rows = []
+        if self.page_template:
+            # Все URL известны заранее - первая страница грузится в одной волне с остальными
+            pending = self._template_urls()
+        else:
+            # Ссылки пагинации можно найти только на первой странице
+            content = self.fetch_page_content()
+            if content is None:
+                return None
+            with self.profiler.stage("parse"):
+                first_page = BeautifulSoup(content, 'html.parser')
+                rows = self._extract_rows(first_page)
+                pending = iter(self._discover_page_urls(first_page))
+            first_page.decompose()
+        
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.page_concurrency) as executor:
+            while True:
+                if self.stop_when_found and self._all_names_present(rows):
+                    break
+                
+                # Загружаем очередную волну страниц параллельно
+                wave = list(islice(pending, self.page_concurrency))
+                if not wave:
+                    break
+                with self.profiler.stage("download"):
+                    pages = list(executor.map(self._fetch_crawl_page, wave))
+                
+                exhausted = False
+                with self.profiler.stage("parse"):
+                    for url, page_content in zip(wave, pages):
+                        if page_content is None:
+                            if url == self.target_url:
+                                # Основная страница недоступна - цикл неудачный, как без пагинации
+                                return None
+                            # Таймаут или 5xx: страница пропущена, но следующие еще могут быть
+                            failed.append(url)
+                            continue
+                        page_soup = BeautifulSoup(page_content, 'html.parser')
+                        page_rows = self._extract_rows(page_soup)
+                        page_soup.decompose()
+                        if not page_rows:
+                            # 404 или пустая страница - дальше страниц нет
+                            exhausted = True
+                            break
+                        rows.extend(page_rows)
+                if exhausted:
+                    break
+        
+        if failed:
+            logger.warning(
+                "Обход неполный: не загружено страниц %d", len(failed),
+                extra={"failed_pages": failed}
+            )
+        # Страницы могли сдвинуться во время обхода - убираем строки, попавшие
+        # на две страницы (совпадают все ячейки, включая номер в очереди)
+        return list(dict.fromkeys(rows))
+    
     def _find_full_name_in_context(self, text_content: str, search_name: str) -> str:
         """Находит полное имя/фамилию в контексте"""
         import re
@@ -98,6 +276,18 @@ class WebsiteMonitor:
     
     def check_for_names(self) -> List[str]:
         """Основной метод для проверки появления имен"""
+        if self.recorder is not None:
+            # Настройки могли смениться админ-командой; запись только при изменении
+            self.recorder.record_config(self)
+            # Страницы цикла грузятся параллельно, поэтому начало цикла отмечаем явно
+            self.recorder.record_cycle()
+        if self.max_pages > 1:
+            rows = self._crawl_rows()
+            if rows is None:
+                return []
+            with self.profiler.stage("search"):
+                return self._match_rows(rows)
+        
         content = self.fetch_page_content()
         if content is None:
             return []
@@ -111,8 +301,10 @@ class WebsiteMonitor:
             return {"error": "Не удалось получить содержимое страницы"}
         
         soup = BeautifulSoup(content, 'html.parser')
+        title = str(soup.title.string) if soup.title and soup.title.string else "Без заголовка"
+        soup.decompose()
         return {
-            "title": soup.title.string if soup.title else "Без заголовка",
+            "title": title,
             "url": self.target_url,
             "content_length": len(content),
             "search_names": self.search_names